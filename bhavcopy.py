@@ -0,0 +1,312 @@
+import os
+import argparse
+import time
+import pandas as pd
+import numpy as np
+
+# Column names across the NSE bhavcopy formats -> our standard OHLCV names
+# Legacy:  cmDDMMMYYYYbhav.csv(.zip)                 (SYMBOL, SERIES, OPEN, ..., TOTTRDQTY, TIMESTAMP)
+# Full:    sec_bhavdata_full_DDMMYYYY.csv            (SYMBOL, SERIES, DATE1, OPEN_PRICE, ..., TTL_TRD_QNTY)
+# UDiFF:   BhavCopy_NSE_CM_0_0_0_YYYYMMDD_F_0000.csv (TckrSymb, SctySrs, TradDt, OpnPric, ..., TtlTradgVol)
+COLUMN_MAP = {
+    'SYMBOL': 'Symbol', 'TckrSymb': 'Symbol',
+    'SERIES': 'Series', 'SctySrs': 'Series',
+    'TIMESTAMP': 'Date', 'DATE1': 'Date', 'TradDt': 'Date',
+    'OPEN': 'Open', 'OPEN_PRICE': 'Open', 'OpnPric': 'Open',
+    'HIGH': 'High', 'HIGH_PRICE': 'High', 'HghPric': 'High',
+    'LOW': 'Low', 'LOW_PRICE': 'Low', 'LwPric': 'Low',
+    'CLOSE': 'Close', 'CLOSE_PRICE': 'Close', 'ClsPric': 'Close',
+    'PREVCLOSE': 'Prev Close', 'PREV_CLOSE': 'Prev Close', 'PrvsClsgPric': 'Prev Close',
+    'TOTTRDQTY': 'Volume', 'TTL_TRD_QNTY': 'Volume', 'TtlTradgVol': 'Volume',
+    'ISIN': 'ISIN',
+}
+
+# Index closes: ind_close_all_DDMMYYYY.csv (Index Name, Index Date, Closing Index Value)
+INDEX_COLUMN_MAP = {'Index Name': 'Index', 'Index Date': 'Date', 'Closing Index Value': 'Close'}
+BENCHMARK_INDEX = 'NIFTY 50'
+
+PRICE_COLS = ['Open', 'High', 'Low', 'Close']
+HISTORY_COLS = PRICE_COLS + ['Volume']
+
+
+class BhavcopyStore:
+    """
+    Offline price history built from NSE daily bhavcopy archives.
+    Drop-in replacement for yf.Ticker().history(period="1y") in StockAnalyzer.
+    """
+
+    DEFAULT_PATH = os.path.join("data", "nse_history.pkl")
+
+    def __init__(self, prices, indices=None):
+        # prices: long format (Date, Symbol, Open, High, Low, Close, Volume)
+        # indices: long format (Date, Index, Close), e.g. the Nifty 50 benchmark
+        self.prices = prices
+        self.indices = indices if indices is not None else pd.DataFrame(columns=['Date', 'Index', 'Close'])
+        self.last_date = prices['Date'].max() if not prices.empty else None
+        # Pre-split per symbol so lookups from the worker threads are O(1)
+        self._by_symbol = {
+            symbol: group.set_index('Date')[HISTORY_COLS]
+            for symbol, group in prices.groupby('Symbol', sort=False)
+        }
+
+    # ------------------------------------------------------------------
+    # Parsing
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _parse_dates(values):
+        """UDiFF uses ISO dates, the older formats 01-JAN-2024, index files 01-01-2024."""
+        dates = values.astype(str).str.strip()
+        for fmt in ['%Y-%m-%d', '%d-%b-%Y', '%d-%m-%Y']:
+            parsed = pd.to_datetime(dates, format=fmt, errors='coerce')
+            if parsed.notna().any():
+                return parsed
+        return parsed
+
+    @staticmethod
+    def read_bhavcopy(path):
+        """
+        Reads one bhavcopy CSV (or a ZIP containing it) into standard columns.
+        """
+        df = pd.read_csv(path, compression='infer', low_memory=False)
+        df.columns = df.columns.str.strip()
+        df = df.rename(columns=COLUMN_MAP)
+        df = df[[c for c in dict.fromkeys(COLUMN_MAP.values()) if c in df.columns]]
+
+        missing = [c for c in ['Symbol', 'Date', 'Close'] if c not in df.columns]
+        if missing:
+            raise ValueError(f"Unrecognised bhavcopy format (missing {missing})")
+
+        for col in ['Symbol', 'Series', 'ISIN']:
+            if col in df.columns:
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str).str.strip())
+
+        df['Date'] = BhavcopyStore._parse_dates(df['Date'])
+
+        for col in HISTORY_COLS + ['Prev Close']:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+        return df.dropna(subset=['Date', 'Close'])
+
+    @staticmethod
+    def read_index_close(path):
+        """
+        Reads one NSE index close file (ind_close_all) into (Date, Index, Close).
+        """
+        df = pd.read_csv(path, compression='infer')
+        df.columns = df.columns.str.strip()
+        df = df.rename(columns=INDEX_COLUMN_MAP)[list(INDEX_COLUMN_MAP.values())]
+        df['Index'] = df['Index'].astype(str).str.strip().str.upper()
+        df['Date'] = BhavcopyStore._parse_dates(df['Date'])
+        df['Close'] = pd.to_numeric(df['Close'], errors='coerce')
+        return df.dropna(subset=['Date', 'Close'])
+
+    @staticmethod
+    def load_symbol_map(path):
+        """
+        Loads symbol renames from a CSV with OLD_SYMBOL and NEW_SYMBOL columns.
+        """
+        df = pd.read_csv(path)
+        df.columns = df.columns.str.strip().str.upper()
+        return dict(zip(df['OLD_SYMBOL'].astype(str).str.strip(), df['NEW_SYMBOL'].astype(str).str.strip()))
+
+    # ------------------------------------------------------------------
+    # Symbol Mapping & Corporate Actions
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def map_symbols(df, symbol_map=None):
+        """
+        Carries renamed stocks onto their current symbol.
+        1. Same ISIN -> symbol used on the latest session.
+        2. Explicit {old: new} renames (followed through chains like A -> B -> C).
+        """
+        if 'ISIN' in df.columns:
+            latest = df.sort_values('Date').groupby('ISIN')['Symbol'].last()
+            df['Symbol'] = df['ISIN'].map(latest).fillna(df['Symbol'])
+
+        if symbol_map:
+            for _ in range(len(symbol_map)):
+                mapped = df['Symbol'].replace(symbol_map)
+                if mapped.equals(df['Symbol']):
+                    break
+                df['Symbol'] = mapped
+        return df
+
+    @staticmethod
+    def adjust_corporate_actions(df, tolerance=0.001):
+        """
+        Back-adjusts prices for splits, bonuses, rights and dividends.
+        NSE publishes an adjusted PREVCLOSE on the ex-date, so PREVCLOSE / yesterday's CLOSE
+        is the adjustment ratio. Earlier prices are multiplied by the product of later ratios
+        (volumes divided), matching the adjusted Close yfinance returns.
+        Ratios are only trusted across consecutive sessions; gaps are skipped with a warning.
+        """
+        if 'Prev Close' not in df.columns:
+            print("Warning: No PREVCLOSE column in archives; skipping corporate-action adjustment.")
+            return df
+
+        df = df.sort_values(['Symbol', 'Date']).reset_index(drop=True)
+        by_symbol = df.groupby('Symbol')
+        last_close = by_symbol['Close'].shift(1)
+        last_date = by_symbol['Date'].shift(1)
+
+        # PREVCLOSE only refers to our previous row if the stock traded in the immediately
+        # preceding ingested session (not e.g. EQ -> BE -> EQ, where it was filtered out)
+        sessions = pd.DatetimeIndex(np.sort(df['Date'].unique()))
+        prev_session = pd.Series(sessions[:-1], index=sessions[1:])
+        contiguous = last_date.eq(df['Date'].map(prev_session))
+
+        ratio = df['Prev Close'] / last_close
+        flagged = contiguous & ((ratio - 1).abs() > tolerance) & (ratio > 0)
+
+        # A real corporate action hits a handful of stocks. If most of the market disagrees
+        # after a weekday gap, the bhavcopy for the gap is missing: skip, don't rewrite history.
+        weekday_gap = pd.Series(np.busday_count(
+            prev_session.values.astype('datetime64[D]') + 1,
+            prev_session.index.values.astype('datetime64[D]')) > 0, index=prev_session.index)
+        mismatch_share = flagged.groupby(df['Date']).sum() / contiguous.groupby(df['Date']).sum()
+        gap_dates = mismatch_share[(mismatch_share > 0.5) & weekday_gap.reindex(mismatch_share.index, fill_value=False)].index
+        if len(gap_dates) > 0:
+            print(f"Warning: Missing bhavcopy session(s) before {', '.join(d.strftime('%d-%b-%Y') for d in gap_dates)}; "
+                  f"skipping corporate-action adjustment across the gap.")
+            flagged &= ~df['Date'].isin(gap_dates)
+
+        skipped = (~contiguous & last_close.notna() & ((ratio - 1).abs() > tolerance)).sum()
+        if skipped > 0:
+            print(f"Warning: {skipped} PREVCLOSE mismatches after a missed session were not treated as corporate actions.")
+
+        ratio = ratio.where(flagged, 1.0)
+
+        # factor_t = product of ratios on sessions after t = exp(total log - running log)
+        log_ratio = np.log(ratio)
+        by_symbol = log_ratio.groupby(df['Symbol'])
+        factor = np.exp(by_symbol.transform('sum') - by_symbol.cumsum())
+
+        adjusted = (factor != 1.0).groupby(df['Symbol']).any().sum()
+        print(f"Corporate Actions: Adjusted history for {adjusted} symbols.")
+
+        for col in PRICE_COLS:
+            if col in df.columns:
+                df[col] = df[col] * factor
+        if 'Volume' in df.columns:
+            df['Volume'] = df['Volume'] / factor
+        return df
+
+    # ------------------------------------------------------------------
+    # Ingest / Persist
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def ingest(cls, directory, series=('EQ',), symbol_map=None):
+        """
+        Bulk-loads every bhavcopy CSV/ZIP in a directory into a store.
+        Index close files (ind_close_all_*.csv) in the same directory provide the benchmark.
+        """
+        files = sorted(
+            os.path.join(directory, f) for f in os.listdir(directory)
+            if f.lower().endswith(('.csv', '.zip'))
+        )
+        print(f"Ingesting {len(files)} bhavcopy files from {directory}...")
+        start_time = time.time()
+
+        frames, index_frames = [], []
+        for i, path in enumerate(files, 1):
+            try:
+                if 'ind_close_all' in os.path.basename(path).lower():
+                    index_frames.append(cls.read_index_close(path))
+                else:
+                    frames.append(cls.read_bhavcopy(path))
+            except Exception as e:
+                print(f"Skipping {os.path.basename(path)}: {e}")
+            if i % 50 == 0:
+                print(f"Read {i}/{len(files)} files...")
+
+        indices = None
+        if index_frames:
+            indices = pd.concat(index_frames, ignore_index=True)
+            indices = indices.drop_duplicates(subset=['Index', 'Date'], keep='last').sort_values(['Index', 'Date'])
+            indices = indices.reset_index(drop=True)
+        else:
+            print(f"Warning: No index close files (ind_close_all_*.csv) found; Beta to {BENCHMARK_INDEX} will be unavailable offline.")
+
+        if not frames:
+            print("No bhavcopy data found.")
+            return cls(pd.DataFrame(columns=['Date', 'Symbol'] + HISTORY_COLS), indices)
+
+        df = pd.concat(frames, ignore_index=True)
+        if series and 'Series' in df.columns:
+            df = df[df['Series'].isin(series)].copy()
+
+        df = cls.map_symbols(df, symbol_map)
+        df = df.drop_duplicates(subset=['Symbol', 'Date'], keep='last')
+        df = cls.adjust_corporate_actions(df)
+
+        prices = df[['Date', 'Symbol'] + [c for c in HISTORY_COLS if c in df.columns]].reset_index(drop=True)
+        print(f"Ingest complete: {prices['Symbol'].nunique()} symbols, {prices['Date'].nunique()} sessions "
+              f"in {time.time() - start_time:.2f} seconds.")
+        return cls(prices, indices)
+
+    def save(self, path=DEFAULT_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        pd.to_pickle({'prices': self.prices, 'indices': self.indices}, path)
+        print(f"[Saved] Price store: {path}")
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        data = pd.read_pickle(path)
+        return cls(data['prices'], data['indices'])
+
+    # ------------------------------------------------------------------
+    # Lookups (used by StockAnalyzer)
+    # ------------------------------------------------------------------
+
+    def symbols(self):
+        """Symbols that traded in the latest session (delisted / suspended names are excluded)."""
+        return [symbol for symbol, hist in self._by_symbol.items() if hist.index[-1] == self.last_date]
+
+    def benchmark(self, index=BENCHMARK_INDEX, period_days=365):
+        """
+        Close series of an index (default Nifty 50) over the same window as history().
+        """
+        closes = self.indices[self.indices['Index'] == index].set_index('Date')['Close']
+        if closes.empty or self.last_date is None:
+            return closes
+        cutoff = self.last_date - pd.Timedelta(days=period_days)
+        return closes[closes.index > cutoff]
+
+    def history(self, symbol, period_days=365):
+        """
+        Same shape as yf.Ticker().history(): Date index with Open/High/Low/Close/Volume.
+        The window ends at the latest session in the store; stocks that did not trade in it
+        return an empty frame so a stale close is never reported as the Current Price.
+        """
+        symbol = symbol[:-3] if symbol.endswith('.NS') else symbol
+        hist = self._by_symbol.get(symbol)
+        if hist is None or hist.index[-1] < self.last_date:
+            return pd.DataFrame(columns=HISTORY_COLS)
+        cutoff = self.last_date - pd.Timedelta(days=period_days)
+        return hist[hist.index > cutoff].copy()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest NSE bhavcopy archives into an offline price store")
+    parser.add_argument('directory', type=str, help="Directory of bhavcopy CSV/ZIP files.")
+    parser.add_argument('--store', type=str, default=BhavcopyStore.DEFAULT_PATH,
+                        help="Output path of the price store.")
+    parser.add_argument('--series', type=str, nargs='+', default=['EQ'],
+                        help="Security series to keep (e.g. EQ BE).")
+    parser.add_argument('--symbol-map', type=str, default=None,
+                        help="Optional CSV of symbol renames (OLD_SYMBOL, NEW_SYMBOL).")
+
+    args = parser.parse_args()
+
+    symbol_map = BhavcopyStore.load_symbol_map(args.symbol_map) if args.symbol_map else None
+    store = BhavcopyStore.ingest(args.directory, series=args.series, symbol_map=symbol_map)
+    if store.last_date is None:
+        print(f"[Not Saved] No readable bhavcopy files in {args.directory}; price store left unchanged.")
+        return
+    store.save(args.store)
+
+if __name__ == "__main__":
+    main()
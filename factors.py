@@ -0,0 +1,384 @@
+import pandas as pd
+import numpy as np
+
+# --- Data Sources ---
+# Each factor declares the fields it reads from these sources. The analyzer fetches only the
+# sources and computes only the per-stock metrics required by the enabled factors.
+HISTORY = 'history'        # stock.history(period="1y")  -> fields: registered history metrics
+INFO = 'info'              # stock.info                  -> fields: raw .info keys
+FINANCIALS = 'financials'  # stock.financials            -> fields: registered fallback metrics (slowest)
+SHARES = 'shares'          # stock.get_shares_full()     -> Market Cap = price x shares (without .info)
+
+# Price history is always loaded: the DataValidator and the universe price filter depend on it.
+BASE_SOURCES = {HISTORY}
+
+# .info keys -> report column names (other keys keep their raw name).
+# Once .info is fetched, all of these are extracted for the report: it is the same single request.
+INFO_COLUMNS = {
+    'longName': 'Company Name',
+    'sector': 'Sector',
+    'industry': 'Industry',
+    'marketCap': 'Market Cap',
+    'trailingPE': 'P/E Ratio',
+    'forwardPE': 'Forward PE',
+    'enterpriseToEbitda': 'EV/EBITDA',
+    'pegRatio': 'PEG Ratio',
+    'priceToBook': 'Price to Book',
+    'dividendYield': 'Dividend Yield',
+    'returnOnEquity': 'ROE',
+    'returnOnCapital': 'ROIC',  # often missing
+    'freeCashflow': 'Free Cash Flow',
+    'netIncomeToCommon': 'Net Income',
+    'interestCoverage': 'Interest Coverage',
+    'debtToEquity': 'Debt to Equity',
+    'profitMargins': 'Profit Margin',
+    'earningsGrowth': 'Earnings Growth',
+    'revenueGrowth': 'Revenue Growth',
+}
+
+# Weight of each composite score in the Final Score.
+# Weights are re-normalized over the groups enabled in a run.
+GROUP_WEIGHTS = {
+    'Quality_Score': 0.40,
+    'Value_Score': 0.30,
+    'Momentum_Score': 0.30,
+    'Low_Vol_Score': 0.20,
+}
+
+
+class Metric:
+    """
+    A per-stock computation on one fetched source (price history or financial statements).
+    HISTORY: compute(hist, ctx) -> dict of columns; ctx carries intermediates for dependent metrics.
+    FINANCIALS: compute(financials) -> value for `column`, used only when .info left it empty.
+    """
+
+    def __init__(self, name, source, compute, depends=(), column=None):
+        self.name = name
+        self.source = source
+        self.compute = compute
+        self.depends = tuple(depends)
+        self.column = column
+
+    def __repr__(self):
+        return f"Metric({self.source}.{self.name})"
+
+
+METRIC_REGISTRY = {HISTORY: {}, FINANCIALS: {}}
+
+
+def register_metric(name, source, depends=(), column=None):
+    """
+    Decorator that registers a per-stock metric that factors can request by name.
+    """
+    def decorator(func):
+        METRIC_REGISTRY[source][name] = Metric(name, source, func, depends, column)
+        return func
+    return decorator
+
+
+class Factor:
+    """
+    A single scoring factor: the fields it reads per source and a vectorized compute function.
+    compute(df) adds its columns to df and returns it; score_col holds a 0-100 score (higher = better).
+    """
+
+    def __init__(self, name, inputs, group, score_col, compute, description=""):
+        self.name = name
+        self.inputs = {source: list(fields) for source, fields in inputs.items()}
+        self.group = group
+        self.score_col = score_col
+        self.compute = compute
+        self.description = description
+
+    def __repr__(self):
+        return f"Factor({self.name}, inputs={self.inputs})"
+
+
+FACTOR_REGISTRY = {}
+
+# The classic Quant Model (Quality Trifecta + Value + Momentum)
+DEFAULT_FACTORS = ['value', 'efficiency', 'cash_conversion', 'safety', 'momentum']
+
+
+def register_factor(name, inputs, group, score_col, description=""):
+    """
+    Decorator that registers a compute function as a factor.
+    inputs: {source: [fields]}, e.g. {INFO: ['dividendYield'], HISTORY: ['risk']}.
+    Groups and metric names are checked here, so a bad factor fails at import, not after the fetch.
+    """
+    if group not in GROUP_WEIGHTS:
+        raise ValueError(f"Factor '{name}': group '{group}' has no weight in GROUP_WEIGHTS {sorted(GROUP_WEIGHTS)}")
+    for source, fields in inputs.items():
+        if source in METRIC_REGISTRY:
+            unknown = [f for f in fields if f not in METRIC_REGISTRY[source]]
+            if unknown:
+                raise ValueError(f"Factor '{name}': unknown {source} metric(s) {unknown}. "
+                                 f"Available: {sorted(METRIC_REGISTRY[source])}")
+        elif source != INFO:
+            raise ValueError(f"Factor '{name}': unknown data source '{source}'")
+
+    def decorator(func):
+        FACTOR_REGISTRY[name] = Factor(name, inputs, group, score_col, func, description)
+        return func
+    return decorator
+
+
+def resolve_factors(names=None):
+    """
+    Returns the list of Factor objects for the given names (defaults to DEFAULT_FACTORS).
+    """
+    if names is None:
+        names = DEFAULT_FACTORS
+    if not names:
+        raise ValueError(f"No factors selected. Available: {sorted(FACTOR_REGISTRY)}")
+    unknown = [n for n in names if n not in FACTOR_REGISTRY]
+    if unknown:
+        raise ValueError(f"Unknown factor(s): {unknown}. Available: {sorted(FACTOR_REGISTRY)}")
+    return [FACTOR_REGISTRY[n] for n in names]
+
+
+def plan_sources(factors, market_cap=True):
+    """
+    Returns the minimum set of data sources needed to compute the given factors.
+    market_cap: the universe filter needs Market Cap (free with .info, else one shares call).
+    """
+    sources = set(BASE_SOURCES)
+    for factor in factors:
+        sources |= {source for source, fields in factor.inputs.items() if fields}
+    if market_cap and INFO not in sources:
+        sources.add(SHARES)
+    return sources
+
+
+def plan_fields(factors):
+    """
+    Returns {source: [fields]} to extract per stock: the union of the factors' fields,
+    with metric dependencies first. If .info is needed at all, the report columns come along.
+    """
+    fields = {HISTORY: [], INFO: [], FINANCIALS: []}
+
+    def add(source, name):
+        if name in fields[source]:
+            return
+        if source in METRIC_REGISTRY:
+            for dep in METRIC_REGISTRY[source][name].depends:
+                add(source, dep)
+        fields[source].append(name)
+
+    for factor in factors:
+        for source, names in factor.inputs.items():
+            for name in names:
+                add(source, name)
+
+    if fields[INFO]:
+        fields[INFO] = list(dict.fromkeys(list(INFO_COLUMNS) + fields[INFO]))
+    return fields
+
+
+# =========================================================================
+# PER-STOCK METRICS (computed in the fetch loop only when a factor asks)
+# =========================================================================
+
+@register_metric('price_changes', HISTORY)
+def price_changes_metric(hist, ctx):
+    close = hist['Close']
+    current_price = close.iloc[-1]
+
+    daily_change = 0
+    if len(close) >= 2:
+        prev_close = close.iloc[-2]
+        daily_change = ((current_price - prev_close) / prev_close) * 100
+
+    # 6M return (126 sessions), or since the start of the history if shorter
+    start_price = close.iloc[-126] if len(close) >= 126 else close.iloc[0]
+    six_month_change = ((current_price - start_price) / start_price) * 100
+
+    return {'Daily Change (%)': round(daily_change, 2), '6M Return (%)': round(six_month_change, 2)}
+
+
+@register_metric('risk', HISTORY)
+def risk_metric(hist, ctx):
+    annual_return = 0
+    annual_volatility = 0
+    sharpe_ratio = 0
+    max_drawdown = 0
+
+    if len(hist) > 1:
+        daily_return = hist['Close'].pct_change()
+
+        # 1. Annualized Return (Mean daily return * 252 trading days)
+        annual_return = ((1 + daily_return.mean()) ** 252) - 1
+
+        # 2. Annualized Volatility (Standard Deviation * sqrt(252))
+        annual_volatility = daily_return.std() * np.sqrt(252)
+
+        # 3. Sharpe Ratio (Risk Free Rate approx 7%)
+        risk_free_rate = 0.07
+        if annual_volatility > 0:
+            sharpe_ratio = (annual_return - risk_free_rate) / annual_volatility
+
+        # 4. Max Drawdown
+        cum_returns = (1 + daily_return).cumprod()
+        running_max = cum_returns.cummax()
+        max_drawdown = ((cum_returns - running_max) / running_max).min()
+
+    ctx['annual_volatility'] = annual_volatility
+    return {
+        'Annual Return (%)': round(annual_return * 100, 2),
+        'Annual Volatility (%)': round(annual_volatility * 100, 2),
+        'Sharpe Ratio': round(sharpe_ratio, 2),
+        'Max Drawdown (%)': round(max_drawdown * 100, 2),
+    }
+
+
+@register_metric('momentum_12m_1m', HISTORY, depends=['risk'])
+def momentum_12m_1m_metric(hist, ctx):
+    # --- PRO FEATURE: Momentum with a Brake (12M - 1M) ---
+    close = hist['Close']
+    annual_volatility = ctx['annual_volatility']
+    momentum_12m_1m = 0
+    risk_adjusted_momentum = 0
+
+    if len(close) >= 252:
+        price_12m_ago = close.iloc[-252]
+        price_1m_ago = close.iloc[-21]
+        momentum_12m_1m = ((price_1m_ago - price_12m_ago) / price_12m_ago)
+    elif len(close) > 21:
+        # Fallback: since the start of the history
+        price_start = close.iloc[0]
+        price_1m_ago = close.iloc[-21]
+        momentum_12m_1m = ((price_1m_ago - price_start) / price_start)
+
+    if annual_volatility > 0:
+        risk_adjusted_momentum = momentum_12m_1m / annual_volatility
+
+    return {'Momentum_12M_1M': momentum_12m_1m, 'Risk_Adjusted_Momentum': risk_adjusted_momentum}
+
+
+@register_metric('interest_coverage', FINANCIALS, column='Interest Coverage')
+def interest_coverage_metric(financials):
+    # EBIT / Interest Expense from the latest annual statement
+    if financials.empty or 'Ebit' not in financials.index or 'Interest Expense' not in financials.index:
+        return None
+    ebit = financials.loc['Ebit'].iloc[0]
+    interest = financials.loc['Interest Expense'].iloc[0]
+    if interest == 0:
+        return None
+    return abs(ebit / interest)
+
+
+def _numeric(df, col):
+    """Numeric view of a column (all NaN if the column was never fetched)."""
+    if col not in df.columns:
+        return pd.Series(np.nan, index=df.index)
+    return pd.to_numeric(df[col], errors='coerce')
+
+
+# =========================================================================
+# VALUATION
+# =========================================================================
+
+@register_factor('value',
+                 inputs={INFO: ['trailingPE', 'earningsGrowth', 'enterpriseToEbitda', 'industry']},
+                 group='Value_Score', score_col='Value_Score',
+                 description="Industry-relative Z-Score of EV/EBITDA (P/E fallback) + Value Trap flag")
+def value_factor(df):
+    pe = _numeric(df, 'P/E Ratio')
+    growth = _numeric(df, 'Earnings Growth')
+
+    # 1. VALUE TRAP
+    df['Is_Value_Trap'] = (pe.fillna(999) < 10) & (growth.fillna(0) < 0)
+
+    trap_count = df['Is_Value_Trap'].sum()
+    if trap_count > 0:
+        print(f"Warning: Detected {trap_count} potential Value Traps (Low P/E + Neg Growth). These will be penalized.")
+
+    # 2. Z-SCORE NORMALIZATION (Relative Valuation)
+    # If EV/EBITDA is present use it, else P/E. If both are missing, treat as expensive.
+    df['Valuation_Metric'] = _numeric(df, 'EV/EBITDA').fillna(pe).fillna(100)
+    df['Industry'] = df['Industry'].fillna('Unknown') if 'Industry' in df.columns else 'Unknown'
+
+    metric = df['Valuation_Metric']
+    grouped = metric.groupby(df['Industry'])
+    ind_mean = grouped.transform('mean')
+    ind_std = grouped.transform('std')
+    ind_count = grouped.transform('count')
+
+    # Thin industries (< 3 peers) or zero dispersion fall back to the whole universe
+    univ_std = metric.std()
+    univ_z = 0 if univ_std == 0 else (metric - metric.mean()) / univ_std
+    use_universe = (ind_count < 3) | ind_std.isna() | (ind_std == 0)
+
+    industry_z = (metric - ind_mean) / ind_std.where(~use_universe)
+    df['Valuation_Z_Score'] = industry_z.where(~use_universe, univ_z)
+    df['Value_Rank'] = df['Valuation_Z_Score'].rank(ascending=True)
+    df['Value_Score'] = 100 - (df['Value_Rank'] / len(df) * 100)
+    return df
+
+
+# =========================================================================
+# QUALITY TRIFECTA
+# =========================================================================
+
+@register_factor('efficiency',
+                 inputs={INFO: ['returnOnCapital', 'returnOnEquity']},
+                 group='Quality_Score', score_col='Efficiency_Score',
+                 description="ROIC (ROE fallback)")
+def efficiency_factor(df):
+    df['Metric_Efficiency'] = _numeric(df, 'ROIC').fillna(_numeric(df, 'ROE')).fillna(0)
+    df['Rank_Efficiency'] = df['Metric_Efficiency'].rank(ascending=True)
+    df['Efficiency_Score'] = df['Rank_Efficiency'] / len(df) * 100
+    return df
+
+
+@register_factor('cash_conversion',
+                 inputs={INFO: ['freeCashflow', 'netIncomeToCommon']},
+                 group='Quality_Score', score_col='Cash_Conv_Score',
+                 description="Free Cash Flow / Net Income")
+def cash_conversion_factor(df):
+    fcf = _numeric(df, 'Free Cash Flow')
+    ni = _numeric(df, 'Net Income')
+    valid = fcf.notna() & ni.notna() & (ni > 0)
+    df['Metric_Cash_Conv'] = (fcf / ni.where(valid)).where(valid, 0)
+    df['Rank_Cash_Conv'] = df['Metric_Cash_Conv'].rank(ascending=True)
+    df['Cash_Conv_Score'] = df['Rank_Cash_Conv'] / len(df) * 100
+    return df
+
+
+@register_factor('safety',
+                 inputs={INFO: ['interestCoverage'], FINANCIALS: ['interest_coverage']},
+                 group='Quality_Score', score_col='Safety_Score',
+                 description="Interest Coverage (EBIT / Interest from financials as fallback)")
+def safety_factor(df):
+    df['Metric_Safety'] = _numeric(df, 'Interest Coverage').fillna(0)
+    df['Rank_Safety'] = df['Metric_Safety'].rank(ascending=True)
+    df['Safety_Score'] = df['Rank_Safety'] / len(df) * 100
+    return df
+
+
+# =========================================================================
+# PRICE-BASED FACTORS (history only)
+# =========================================================================
+
+@register_factor('momentum',
+                 inputs={HISTORY: ['momentum_12m_1m']},
+                 group='Momentum_Score', score_col='Momentum_Score',
+                 description="Risk-Adjusted 12M-1M Momentum")
+def momentum_factor(df):
+    df['Mom_Metric'] = _numeric(df, 'Risk_Adjusted_Momentum').fillna(-100)
+    df['Momentum_Rank'] = df['Mom_Metric'].rank(ascending=True)
+    df['Momentum_Score'] = df['Momentum_Rank'] / len(df) * 100
+    return df
+
+
+@register_factor('low_volatility',
+                 inputs={HISTORY: ['risk']},
+                 group='Low_Vol_Score', score_col='Low_Vol_Score',
+                 description="Low Annual Volatility (calmer stocks rank higher)")
+def low_volatility_factor(df):
+    vol = _numeric(df, 'Annual Volatility (%)')
+    # Missing volatility ranks as the riskiest
+    df['Low_Vol_Rank'] = vol.fillna(np.inf).rank(ascending=False)
+    df['Low_Vol_Score'] = df['Low_Vol_Rank'] / len(df) * 100
+    return df
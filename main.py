@@ -5,6 +5,9 @@ from utils import get_nifty50_tickers, get_all_nse_tickers
 from analyzer import StockAnalyzer
 from visualizer import generate_interactive_dashboard
 from sentiment import MarketSentiment
+from factors import FACTOR_REGISTRY, DEFAULT_FACTORS, resolve_factors, INFO, FINANCIALS, SHARES
+from risk import CrossSectionalRisk
+from bhavcopy import BhavcopyStore
 
 def main():
     parser = argparse.ArgumentParser(description="Automated Stock Fundamental Analyzer")
@@ -12,8 +15,22 @@ def main():
                         help="Choose 'nifty50' for top 50 stocks or 'all' for all NSE stocks.")
     parser.add_argument('--workers', type=int, default=10,
                         help="Number of concurrent threads for data fetching.")
+    parser.add_argument('--factors', type=str, default=','.join(DEFAULT_FACTORS),
+                        help=f"Comma-separated factors to score on. Only the data they need is fetched. "
+                             f"Available: {', '.join(FACTOR_REGISTRY)}.")
+    parser.add_argument('--history-source', type=str, choices=['yahoo', 'bhavcopy'], default='yahoo',
+                        help="Price history from Yahoo (per-ticker requests) or an offline bhavcopy store.")
+    parser.add_argument('--bhavcopy-store', type=str, default=BhavcopyStore.DEFAULT_PATH,
+                        help="Price store built with 'python bhavcopy.py <archive_dir>'.")
+    parser.add_argument('--no-market-cap-filter', action='store_true',
+                        help="Filter the universe on price only, so Market Cap is not fetched from Yahoo.")
     
     args = parser.parse_args()
+    factors = [f.strip() for f in args.factors.split(',') if f.strip()]
+    try:
+        resolve_factors(factors)
+    except ValueError as e:
+        parser.error(str(e))
 
     # --- 0. Market Sentiment Check (New Feature) ---
     print("\n--- MARKET SENTIMENT (AI Powered) ---")
@@ -27,8 +44,21 @@ def main():
             print(f"- {row['Title']}")
     print("-" * 40 + "\n")
 
+    history_store = None
+    if args.history_source == 'bhavcopy':
+        if os.path.exists(args.bhavcopy_store):
+            history_store = BhavcopyStore.load(args.bhavcopy_store)
+        if history_store is None or history_store.last_date is None:
+            print(f"Price store not found or empty: {args.bhavcopy_store}")
+            print("Build it first with: python bhavcopy.py <bhavcopy_archive_dir>")
+            return
+        print(f"Using offline bhavcopy history ({len(history_store.symbols())} symbols, up to {history_store.last_date:%d-%b-%Y}).")
+
     # 1. Get Tickers
-    if args.mode == 'all':
+    if args.mode == 'all' and history_store is not None:
+        print("Using all symbols in the bhavcopy store.")
+        tickers = history_store.symbols()
+    elif args.mode == 'all':
         print("Fetching full NSE stock list (this may take a moment)...")
         tickers = get_all_nse_tickers()
     else:
@@ -38,7 +68,12 @@ def main():
     print(f"Total tickers to process: {len(tickers)}")
 
     # 2. Run Analysis
-    analyzer = StockAnalyzer()
+    analyzer = StockAnalyzer(factors=factors, history_store=history_store,
+                             market_cap=not args.no_market_cap_filter)
+    yahoo_sources = analyzer.sources & {INFO, FINANCIALS, SHARES}
+    if history_store is not None and yahoo_sources:
+        print(f"Note: Prices are offline, but {', '.join(sorted(yahoo_sources))} still come from Yahoo. "
+              f"Use price-only factors with --no-market-cap-filter for a fully offline run.")
     df_results = analyzer.analyze_stocks(tickers, max_workers=args.workers)
 
     if df_results.empty:
@@ -48,8 +83,12 @@ def main():
     # 3. Filter Universe (Pro Standard)
     # Only keep stocks with > 5000 Cr Market Cap and > 10 INR Price
     # This removes "Noise" from the analysis
-    print("Applying Universe Filter (Market Cap > 5000Cr)...")
-    df_results = analyzer.filter_universe(df_results, min_market_cap=50000000000, min_price=10)
+    if args.no_market_cap_filter:
+        print("Applying Universe Filter (Price > 10 INR, Market Cap filter disabled)...")
+        df_results = analyzer.filter_universe(df_results, min_market_cap=None, min_price=10)
+    else:
+        print("Applying Universe Filter (Market Cap > 5000Cr)...")
+        df_results = analyzer.filter_universe(df_results, min_market_cap=50000000000, min_price=10)
     
     if df_results.empty:
         print("No stocks passed the universe filter criteria.")
@@ -60,6 +99,9 @@ def main():
     print("Calculating Quant Models...")
     df_results = analyzer.calculate_quant_score(df_results)
 
+    # 4b. Cross-Sectional Risk (Beta vs Nifty + Correlation Clusters)
+    df_results = analyzer.calculate_cross_sectional_risk(df_results)
+
     # 5. Granular Insights (Targeted News for Top Picks)
     # We sort by Score to find the 'Winners'
     if 'Final_Score' in df_results.columns:
@@ -69,9 +111,21 @@ def main():
     
     print("\n--- TOP 5 STOCKS (With News Context) ---")
     
-    cols_to_show = ['Symbol', 'Current Price', 'Final_Score', 'PE_Z_Score', 'Quality_Score', 'Momentum_Score', 'Is_Value_Trap']
+    cols_to_show = ['Symbol', 'Current Price', 'Final_Score', 'PE_Z_Score', 'Quality_Score', 'Momentum_Score', 'Beta', 'Corr_Cluster', 'Is_Value_Trap']
     cols_to_show = [c for c in cols_to_show if c in df_results.columns]
     print(top_picks[cols_to_show].to_string(index=False))
+
+    # Diversification Check: are the top picks really one trade?
+    if analyzer.corr_matrix.empty:
+        print("\nDiversification Check: unavailable (no aligned price history).")
+    else:
+        is_diversified, n_clusters, corr_pairs = CrossSectionalRisk.diversification_check(top_picks, analyzer.corr_matrix)
+        if is_diversified:
+            print(f"\nDiversification Check: PASSED ({n_clusters} distinct correlation clusters).")
+        else:
+            print(f"\nDiversification Warning: Top {len(top_picks)} span only {n_clusters} correlation cluster(s).")
+            if not corr_pairs.empty:
+                print(corr_pairs.to_string(index=False))
     
     print("\nFetching specific news for top picks...")
     for idx, row in top_picks.iterrows():
@@ -0,0 +1,140 @@
+import yfinance as yf
+import pandas as pd
+import numpy as np
+from scipy.cluster.hierarchy import linkage, fcluster
+from scipy.spatial.distance import squareform
+
+class CrossSectionalRisk:
+    """
+    Universe-wide risk: Beta to Nifty, correlation matrix and correlation clusters.
+    Everything is computed in batched matrix operations over the aligned return panel.
+    """
+
+    BENCHMARK = "^NSEI"
+
+    @staticmethod
+    def fetch_benchmark(symbol=BENCHMARK, period="1y"):
+        """
+        Fetches the benchmark (Nifty 50 index) close series.
+        """
+        try:
+            hist = yf.Ticker(symbol).history(period=period)
+            return hist['Close']
+        except Exception as e:
+            print(f"Warning: Could not fetch benchmark {symbol}: {e}")
+            return pd.Series(dtype=float)
+
+    @staticmethod
+    def build_return_panel(price_history):
+        """
+        Aligns {symbol: close series} into a (dates x symbols) daily return panel.
+        Missing sessions stay NaN; they are handled pair-wise downstream.
+        """
+        closes = {}
+        for symbol, close in price_history.items():
+            close = close.copy()
+            if close.index.tz is not None:
+                close.index = close.index.tz_localize(None)
+            # Align on session date (yfinance stamps may carry a time component)
+            close.index = close.index.normalize()
+            closes[symbol] = close[~close.index.duplicated(keep='last')]
+
+        if not closes:
+            return pd.DataFrame()
+        return pd.DataFrame(closes).sort_index().pct_change(fill_method=None).iloc[1:]
+
+    @staticmethod
+    def pairwise_stats(x, y):
+        """
+        Pair-wise complete covariance and correlation between every column of x and every column of y.
+        x: (T x N), y: (T x M) arrays with NaN for missing data.
+        Returns (cov, corr, n_obs, var_y), each (N x M); var_y is the variance of y over each overlap.
+        """
+        mx, my = ~np.isnan(x), ~np.isnan(y)
+        x0, y0 = np.where(mx, x, 0.0), np.where(my, y, 0.0)
+        mx, my = mx.astype(float), my.astype(float)
+
+        n = mx.T @ my                    # overlapping observations per pair
+        sx = x0.T @ my                   # sum of x over the overlap
+        sy = mx.T @ y0                   # sum of y over the overlap
+        sxx = (x0 ** 2).T @ my
+        syy = mx.T @ (y0 ** 2)
+        sxy = x0.T @ y0
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = (sxy - sx * sy / n) / (n - 1)
+            var_x = (sxx - sx ** 2 / n) / (n - 1)
+            var_y = (syy - sy ** 2 / n) / (n - 1)
+            corr = cov / np.sqrt(var_x * var_y)
+        return cov, corr, n, var_y
+
+    @staticmethod
+    def compute(price_history, benchmark=None, min_overlap=60, cluster_threshold=0.5):
+        """
+        Returns (metrics DataFrame indexed by Symbol, correlation matrix DataFrame).
+        Metrics: Beta, Avg_Correlation, Corr_Cluster.
+        cluster_threshold is a correlation distance sqrt((1 - corr) / 2); 0.5 ~ corr of 0.5.
+        """
+        returns = CrossSectionalRisk.build_return_panel(price_history)
+        if returns.empty:
+            return pd.DataFrame(), pd.DataFrame()
+
+        symbols = returns.columns
+        x = returns.to_numpy(dtype=float)
+
+        # --- 1. Correlation Matrix (N x N in one pass) ---
+        _, corr, n_obs, _ = CrossSectionalRisk.pairwise_stats(x, x)
+        corr[n_obs < min_overlap] = np.nan
+        corr = np.clip(corr, -1, 1)
+        np.fill_diagonal(corr, 1.0)
+        corr_df = pd.DataFrame(corr, index=symbols, columns=symbols)
+
+        metrics = pd.DataFrame(index=symbols)
+        off_diag = corr.copy()
+        np.fill_diagonal(off_diag, np.nan)
+        known = ~np.isnan(off_diag)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            metrics['Avg_Correlation'] = np.where(known, off_diag, 0.0).sum(axis=1) / known.sum(axis=1)
+
+        # --- 2. Beta to Benchmark (N x 1) ---
+        metrics['Beta'] = np.nan
+        if benchmark is not None and not benchmark.empty:
+            market = CrossSectionalRisk.build_return_panel({'Market': benchmark}).reindex(returns.index)
+            cov_m, _, n_m, var_m = CrossSectionalRisk.pairwise_stats(x, market.to_numpy(dtype=float))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                beta = (cov_m / var_m)[:, 0]
+            beta[n_m[:, 0] < min_overlap] = np.nan
+            metrics['Beta'] = beta
+
+        # --- 3. Hierarchical Correlation Clusters ---
+        metrics['Corr_Cluster'] = np.arange(1, len(symbols) + 1)
+        if len(symbols) > 1:
+            # Unknown correlations are treated as uncorrelated
+            dist = np.sqrt(np.clip((1 - np.nan_to_num(corr, nan=0.0)) / 2, 0, 1))
+            np.fill_diagonal(dist, 0.0)
+            tree = linkage(squareform(dist, checks=False), method='average')
+            metrics['Corr_Cluster'] = fcluster(tree, t=cluster_threshold, criterion='distance')
+
+        metrics['Beta'] = metrics['Beta'].round(2)
+        metrics['Avg_Correlation'] = metrics['Avg_Correlation'].round(2)
+        metrics.index.name = 'Symbol'
+        return metrics, corr_df
+
+    @staticmethod
+    def diversification_check(top_picks, corr_df, max_corr=0.7):
+        """
+        Checks whether the top picks are really independent bets.
+        Returns: (is_diversified, distinct_clusters, DataFrame of highly correlated pairs)
+        """
+        symbols = [s for s in top_picks['Symbol'] if s in corr_df.index]
+        pairs = []
+        if len(symbols) > 1:
+            sub = corr_df.loc[symbols, symbols].to_numpy()
+            i, j = np.triu_indices(len(symbols), k=1)
+            mask = sub[i, j] >= max_corr
+            pairs = [{'Stock A': symbols[a], 'Stock B': symbols[b], 'Correlation': round(sub[a, b], 2)}
+                     for a, b in zip(i[mask], j[mask])]
+
+        distinct_clusters = top_picks['Corr_Cluster'].nunique() if 'Corr_Cluster' in top_picks.columns else len(symbols)
+        is_diversified = not pairs and distinct_clusters == len(top_picks)
+        return is_diversified, distinct_clusters, pd.DataFrame(pairs)